@@ -50,7 +50,7 @@ def main():
     print(json.dumps(tableify(after), indent=2))
 
     print("\\n=== AUDIT LOG ===")
-    print(json.dumps(engine.audit_log, indent=2))
+    print(json.dumps(list(engine.audit_records), indent=2))
 
 if __name__ == "__main__":
     main()
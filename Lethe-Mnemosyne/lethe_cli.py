@@ -28,7 +28,7 @@ def main():
 
     print("\n=== APPLYING RULES ===")
     after = engine.apply_rules(memories, context)
-    for log in engine.audit_log:
+    for log in engine.audit_records:
         print(f"[RULE] {log}")
 
     print("\n=== AFTER RULES ===")
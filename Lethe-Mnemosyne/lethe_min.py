@@ -9,6 +9,8 @@
 #     * rule on trust < T -> forget topic:"..." keep_log:bool
 #     * rule on event == "..." with E=<emotion> -> reinforce tag:"..." by <float>
 # - Optional interference: new memory attenuates similar prior memories (topic or tag)
+# - Optional composite retrieval score (retrieval { score: composite }): weighted sum of
+#   semantic match, recency, access frequency and importance, z-scored and squashed to 0..1
 # - Tiny DSL parser (line-based, tolerant), no external deps
 #
 # API used by lethe_cli.py:
@@ -16,7 +18,9 @@
 #   before = engine.search(memories, query)
 #   after  = engine.apply_rules(memories, context)
 #   after2 = engine.search(after, query)
-#   engine.audit_log -> list of dicts
+#   engine.audit_log -> list of AuditEntry(stage, type, data)
+#   engine.audit_records -> the same entries as plain dicts (for printing / JSON)
+#   engine.compile()   # optional: parse() does it, apply_rules() redoes it after rule edits
 #
 # Memory item schema (dict expected, minimal):
 # {
@@ -27,19 +31,34 @@
 #   "emotion": str (optional),   # e.g., "sadness", "gratitude"
 #   "weight": float (optional),  # defaults to 0.5
 #   "timestamp": "YYYY-MM-DD" (optional)
+#   "access_count": int (optional)   # only read by the composite score; non-numeric counts as 0
 # }
+# The engine never writes to these dicts. Lowered tags/topic/emotion are sys.intern()ed
+# (memoised by _lc_name); the lowered fields used by search() live on its column view.
 #
 # Notes:
 # - We keep everything simple and robust; failures default to no-op with audit entry.
 # - Time decay is applied on search() using timestamp and the attached emotion kernel.
+# - search() works on a column view of the memory list (see MemoryIndex). Views of the
+#   last few lists are cached per list object and reused only while every item's raw
+#   fields (weight, timestamp, emotion, content, ...) still match, so edits and replaced
+#   items always trigger a rebuild.
+# - Decayed weights are reused within an hour bucket (DECAY_BUCKETS_PER_DAY), so repeated
+#   queries against the same list do no decay work; decay moves in hour steps.
+# - Query matching goes through topic/tag/content-token postings on that view, so only the
+#   matching subset is touched; content matching keeps plain substring semantics.
 
 from __future__ import annotations
 
+import heapq
 import math
 import re
-from dataclasses import dataclass, field
+import sys
+from collections import OrderedDict
+from dataclasses import astuple, dataclass, field
+from functools import lru_cache, partial
 from datetime import datetime, timezone
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Any, Set, Tuple
 
 
 # ---------- Emotions & Decay Kernels ----------
@@ -70,6 +89,53 @@ def apply_decay_with_floor(w0: float, floor: float, factor01: float) -> float:
     factor = max(0.0, min(1.0, factor01))
     return floor + (max(w0, floor) - floor) * factor
 
+# kernel ids used by the column layout; unknown kernels fall back to exponential
+DECAY_EXPONENTIAL, DECAY_POWER_LAW, DECAY_SIGMOID, DECAY_TANH = range(4)
+_DECAY_FN_IDS = {
+    "exponential": DECAY_EXPONENTIAL,
+    "power_law": DECAY_POWER_LAW,
+    "sigmoid": DECAY_SIGMOID,
+    "tanh": DECAY_TANH,
+}
+
+def _kernel_params(emo: Emotion) -> Tuple[int, float, float, float]:
+    """Resolve (fn_id, lam, k, t0) for an emotion, filling in each kernel's default k / t0."""
+    fn_id = _DECAY_FN_IDS.get(emo.decay_fn, DECAY_EXPONENTIAL)
+    if fn_id == DECAY_POWER_LAW:
+        return fn_id, emo.lam, float(emo.params.get("k", 1.0)), 0.0
+    if fn_id == DECAY_SIGMOID:
+        return fn_id, emo.lam, float(emo.params.get("k", 1.0)), float(emo.params.get("t0", 7.0))
+    if fn_id == DECAY_TANH:
+        return fn_id, emo.lam, float(emo.params.get("k", 0.3)), float(emo.params.get("t0", 7.0))
+    return fn_id, emo.lam, 0.0, 0.0
+
+
+def _decay_all(groups, ts, lam, k, t0, floor, w0, t_now, out) -> None:
+    """Batch decay driver: out[i] = floored, decayed w0[i] for every position in groups.
+
+    groups[fn_id] lists the positions using that kernel; the other arguments are
+    columns indexed by position. Each kernel is one flat loop with the math bound to
+    locals (same formulas as the scalar kernels above), with the floor clamp fused in.
+    """
+    exp, tanh = math.exp, math.tanh
+    g_exp, g_pow, g_sig, g_tanh = groups
+    for i in g_exp:
+        f = exp(-lam[i] * max(0.0, t_now - ts[i]))
+        fl = floor[i]
+        out[i] = fl + (max(w0[i], fl) - fl) * max(0.0, min(1.0, f))
+    for i in g_pow:
+        f = 1.0 / ((max(0.0, t_now - ts[i]) + 1.0) ** max(k[i], 1e-6))
+        fl = floor[i]
+        out[i] = fl + (max(w0[i], fl) - fl) * max(0.0, min(1.0, f))
+    for i in g_sig:
+        f = 1.0 - (1.0 / (1.0 + exp(-k[i] * (max(0.0, t_now - ts[i]) - t0[i]))))
+        fl = floor[i]
+        out[i] = fl + (max(w0[i], fl) - fl) * max(0.0, min(1.0, f))
+    for i in g_tanh:
+        f = (1.0 - tanh(k[i] * (max(0.0, t_now - ts[i]) - t0[i]))) * 0.5
+        fl = floor[i]
+        out[i] = fl + (max(w0[i], fl) - fl) * max(0.0, min(1.0, f))
+
 
 # ---------- Rules ----------
 
@@ -92,6 +158,133 @@ class InterfereRule:
     alpha: float = 0.1
 
 
+# ---------- Audit ----------
+
+class AuditEntry(NamedTuple):
+    stage: str                 # 'parser' | 'engine'
+    type: str                  # e.g. 'parse_emotion', 'forget', 'reinforce', 'interference'
+    data: Dict[str, Any]
+
+
+# ---------- Column view ----------
+
+INDEX_CACHE_SIZE = 8          # column views kept per engine (one per memory list)
+DECAY_BUCKETS_PER_DAY = 24    # decayed weights are reused within one hour
+CONTENT_HITS_CACHE_SIZE = 256 # content-match sets kept per view (one per query), LRU
+
+@dataclass
+class MemoryIndex:
+    """Structure-of-arrays view of one memory list, built by LetheEngine._index().
+
+    Column i describes source[i]; raw[i] is the _raw_fields() snapshot it was built from.
+    timestamps_days is None for items without a (parsable) timestamp; those keep their
+    weight undecayed. kernel_groups holds the positions of timestamped items per kernel
+    id, so decay runs one tight pass per kernel; the result is kept in decayed for the
+    time bucket it was computed in. texts holds the lowered content per position, and
+    topic_index/tag_index/tok_index map lowered topic, tag and content token to positions.
+    """
+    source: List[dict]
+    raw: List[tuple]
+    emotions_key: tuple        # LetheEngine._emotions_key() the kernel columns were resolved with
+    weights: List[float]
+    timestamps_days: List[Optional[float]]
+    lam: List[float]
+    floor: List[float]
+    decay_fn_id: List[int]
+    k: List[float]
+    t0: List[float]
+    texts: List[str]
+    kernel_groups: Tuple[List[int], ...] = ()
+    topic_index: Dict[str, Set[int]] = field(default_factory=dict)
+    tag_index: Dict[str, Set[int]] = field(default_factory=dict)
+    tok_index: Dict[str, Set[int]] = field(default_factory=dict)
+    _content_hits: "OrderedDict[str, Set[int]]" = field(default_factory=OrderedDict)
+    freq: Optional[List[float]] = None         # access_count column, built by the composite score
+    decay_bucket: Optional[int] = None         # bucket the decayed column was computed for
+    decayed: Optional[List[float]] = None
+    recency_bucket: Optional[int] = None       # same, for the raw 0..1 decay factors
+    recency: Optional[List[float]] = None
+
+    def content_hits(self, q: str) -> Set[int]:
+        """Positions whose lowered content contains q (substring, like `q in content`)."""
+        cache = self._content_hits
+        hits = cache.get(q)
+        if hits is not None:
+            cache.move_to_end(q)
+            return hits
+        if q.split() == [q]:
+            # no whitespace in q → any occurrence lies inside a single content token
+            hits = set(self.tok_index.get(q, ()))
+            for tok, pos in self.tok_index.items():
+                if q in tok and tok != q:
+                    hits |= pos
+        else:
+            hits = {i for i, text in enumerate(self.texts) if q in text}
+        cache[q] = hits
+        if len(cache) > CONTENT_HITS_CACHE_SIZE:
+            cache.popitem(last=False)
+        return hits
+
+
+# ---------- DSL patterns ----------
+
+# compiled once; parse() picks the pattern by the line's leading keyword
+_RE_KEYWORD = re.compile(r'[A-Za-z_]+')
+_RE_RULE_HEAD = re.compile(r'^rule\s+on\s+(\w+)', re.I)
+_RE_EMOTION = re.compile(r'^emotion\s+([A-Za-z_][\w-]*)\s*\{([^}]*)\}\s*$')
+_RE_INTERFERE = re.compile(r'^interference\s*\{([^}]*)\}\s*$')
+_RE_FORGET = re.compile(r'^rule\s+on\s+trust\s*<\s*([0-9.]+)\s*->\s*forget\s+topic:\s*"(.*?)"(?:\s+keep_log\s*:\s*(true|false))?\s*$', re.I)
+_RE_REINFORCE = re.compile(r'^rule\s+on\s+event\s*==\s*"(.*?)"(?:\s+with\s+E\s*=\s*([A-Za-z_][\w-]*))?\s*->\s*reinforce\s+tag:\s*"(.*?)"\s+by\s*([0-9.]+)\s*$', re.I)
+_RE_RETRIEVAL = re.compile(r'^retrieval\s*\{([^}]*)\}\s*$')
+
+
+def _is_word(ch: str) -> bool:
+    # same class as the regex \w on str
+    return ch.isalnum() or ch == "_"
+
+
+# ---------- Names ----------
+
+def _raw_fields(m: dict) -> tuple:
+    """The fields of m a column view is built from; a cached view is reused only while they match."""
+    tags = m.get("tags")
+    return (m.get("weight"), m.get("timestamp"), m.get("emotion"), m.get("access_count"),
+            m.get("content"), m.get("topic"), tuple(tags) if tags else tags)
+
+
+@lru_cache(maxsize=4096)
+def _lc_name(name: str) -> str:
+    """Lowered, interned tag/topic/emotion name; memoised since these repeat across memories."""
+    return sys.intern(name.lower())
+
+
+def _access_count(m: dict) -> float:
+    """access_count of m as a float; missing, non-numeric or non-finite values count as 0."""
+    try:
+        f = float(m.get("access_count") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    return f if math.isfinite(f) else 0.0
+
+
+# ---------- Timestamps ----------
+
+# the only shape sent to fromisoformat; anything else goes through strptime('%Y-%m-%d')
+_RE_ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}\Z', re.ASCII)
+
+@lru_cache(maxsize=4096)
+def _iso_days(ts: str) -> Optional[float]:
+    """Days since epoch (UTC) for a YYYY-MM-DD date string; memoised since many memories share dates."""
+    try:
+        if _RE_ISO_DATE.match(ts):
+            dt = datetime.fromisoformat(ts)   # C fast path for the canonical shape
+        else:
+            dt = datetime.strptime(ts, "%Y-%m-%d")   # other forms it accepts (e.g. 2025-1-5)
+    except Exception:
+        return None
+    return dt.replace(tzinfo=timezone.utc).timestamp() / 86400.0
+
+
 # ---------- Engine ----------
 
 class LetheEngine:
@@ -99,10 +292,18 @@ class LetheEngine:
         self.emotions: Dict[str, Emotion] = {}
         self.forget_rules: List[ForgetRule] = []
         self.reinforce_rules: List[ReinforceRule] = []
+        # derived by compile(): event -> [(rule, tag_lower, gate_lower)], and the step plan
+        self._reinforce_by_event: Dict[str, List[Tuple[ReinforceRule, str, Optional[str]]]] = {}
+        self._plan: List[Callable[..., None]] = []
+        self._plan_key: Optional[tuple] = None   # _rules_key() the plan was compiled from
         self.interfere_rule: Optional[InterfereRule] = None
         self.retrieval_topk: int = 5
         self.retrieval_gate: str = "E-weighted"
-        self.audit_log: List[Dict[str, Any]] = []
+        self.retrieval_score: str = "additive"   # 'additive' (weight + match) | 'composite'
+        # composite score weights: semantic match, recency, access frequency, importance
+        self.score_weights: Dict[str, float] = {"sem": 0.45, "rec": 0.25, "freq": 0.05, "imp": 0.10}
+        self.audit_log: List[AuditEntry] = []
+        self._indexes: "OrderedDict[int, MemoryIndex]" = OrderedDict()   # id(list) -> view, LRU
         # default emotion
         self.emotions["neutral"] = Emotion(name="neutral", lam=0.08, floor=0.0, decay_fn="exponential")
         if dsl:
@@ -110,95 +311,162 @@ class LetheEngine:
 
     # ----- Parsing -----
     def parse(self, text: str) -> None:
-        lines = [ln.strip() for ln in text.splitlines() if ln.strip() and not ln.strip().startswith("#")]
-        for ln in lines:
-            # emotion NAME { ... }
-            m = re.match(r'^emotion\s+([A-Za-z_][\w-]*)\s*\{([^}]*)\}\s*$', ln)
-            if m:
-                name, body = m.group(1), m.group(2)
-                params = self._parse_kv(body)
-                emo = Emotion(
-                    name=name,
-                    lam=float(params.get("lambda", params.get("lam", 0.1))),
-                    floor=float(params.get("floor", 0.0)),
-                    decay_fn=str(params.get("decay", "exponential")).lower(),
-                    params={k: float(v) for k, v in params.items() if k in ("k", "t0")}
-                )
-                self.emotions[name] = emo
-                self._audit("parse_emotion", {"name": name, **params})
+        self.invalidate()  # emotions may change → cached columns are stale
+        dispatch = {
+            "emotion": self._parse_emotion_line,
+            "interference": self._parse_interference_line,
+            "rule": self._parse_rule_line,
+            "retrieval": self._parse_retrieval_line,
+            "decay": self._parse_decay_line,
+        }
+        for raw in text.splitlines():
+            ln = raw.strip()
+            if not ln or ln.startswith("#"):
                 continue
-
-            # interference { match="topic", alpha=0.12 }
-            m = re.match(r'^interference\s*\{([^}]*)\}\s*$', ln)
-            if m:
-                body = m.group(1)
-                params = self._parse_kv(body)
-                self.interfere_rule = InterfereRule(
-                    match=str(params.get("match", "topic")).strip('"').strip("'"),
-                    alpha=float(params.get("alpha", 0.1))
-                )
-                self._audit("parse_interference", {"params": params})
-                continue
-
+            # dispatch on the leading keyword so each line runs only its own pattern
+            kw = _RE_KEYWORD.match(ln)
+            handler = dispatch.get(kw.group(0).lower()) if kw else None
+            if handler is None or not handler(ln):
+                self._audit("parse_unknown", {"line": ln})
+        self.compile()
+
+    def _parse_emotion_line(self, ln: str) -> bool:
+        # emotion NAME { ... }
+        m = _RE_EMOTION.match(ln)
+        if not m:
+            return False
+        name, body = sys.intern(m.group(1)), m.group(2)
+        params = self._parse_kv(body)
+        emo = Emotion(
+            name=name,
+            lam=float(params.get("lambda", params.get("lam", 0.1))),
+            floor=float(params.get("floor", 0.0)),
+            decay_fn=str(params.get("decay", "exponential")).lower(),
+            params={k: float(v) for k, v in params.items() if k in ("k", "t0")}
+        )
+        self.emotions[name] = emo
+        self._audit("parse_emotion", {"name": name, **params})
+        return True
+
+    def _parse_interference_line(self, ln: str) -> bool:
+        # interference { match="topic", alpha=0.12 }
+        m = _RE_INTERFERE.match(ln)
+        if not m:
+            return False
+        body = m.group(1)
+        params = self._parse_kv(body)
+        self.interfere_rule = InterfereRule(
+            match=str(params.get("match", "topic")).strip('"').strip("'"),
+            alpha=float(params.get("alpha", 0.1))
+        )
+        self._audit("parse_interference", {"params": params})
+        return True
+
+    def _parse_rule_line(self, ln: str) -> bool:
+        # peek at "rule on <trigger>" to pick the one pattern worth trying
+        head = _RE_RULE_HEAD.match(ln)
+        trigger = head.group(1).lower() if head else ""
+
+        if trigger == "trust":
             # rule on trust < 0.4 -> forget topic:"ex-relationship" keep_log:true
-            m = re.match(r'^rule\s+on\s+trust\s*<\s*([0-9.]+)\s*->\s*forget\s+topic:\s*"(.*?)"(?:\s+keep_log\s*:\s*(true|false))?\s*$', ln, re.I)
-            if m:
-                thr = float(m.group(1))
-                topic = m.group(2)
-                keep = True if (m.group(3) or "").lower() == "true" else True
-                self.forget_rules.append(ForgetRule(trust_lt=thr, topic=topic, keep_log=keep))
-                self._audit("parse_rule_forget", {"trust_lt": thr, "topic": topic, "keep_log": keep})
-                continue
-
+            m = _RE_FORGET.match(ln)
+            if not m:
+                return False
+            thr = float(m.group(1))
+            topic = m.group(2)
+            keep = True if (m.group(3) or "").lower() == "true" else True
+            self.forget_rules.append(ForgetRule(trust_lt=thr, topic=topic, keep_log=keep))
+            self._audit("parse_rule_forget", {"trust_lt": thr, "topic": topic, "keep_log": keep})
+            return True
+
+        if trigger == "event":
             # rule on event == "milestone" with E=gratitude -> reinforce tag:"support-thread" by 0.2
-            m = re.match(r'^rule\s+on\s+event\s*==\s*"(.*?)"(?:\s+with\s+E\s*=\s*([A-Za-z_][\w-]*))?\s*->\s*reinforce\s+tag:\s*"(.*?)"\s+by\s*([0-9.]+)\s*$', ln, re.I)
-            if m:
-                event, emo_gate, tag, by = m.group(1), m.group(2), m.group(3), float(m.group(4))
-                self.reinforce_rules.append(ReinforceRule(event_eq=event, emotion_gate=emo_gate, tag=tag, by=by))
-                self._audit("parse_rule_reinforce", {"event_eq": event, "E": emo_gate, "tag": tag, "by": by})
-                continue
+            m = _RE_REINFORCE.match(ln)
+            if not m:
+                return False
+            event, emo_gate, tag, by = m.group(1), m.group(2), m.group(3), float(m.group(4))
+            self.reinforce_rules.append(ReinforceRule(event_eq=event, emotion_gate=emo_gate, tag=tag, by=by))
+            self._audit("parse_rule_reinforce", {"event_eq": event, "E": emo_gate, "tag": tag, "by": by})
+            return True
+
+        return False
+
+    def _parse_retrieval_line(self, ln: str) -> bool:
+        # retrieval { gate: E-weighted, topk: 5 }
+        m = _RE_RETRIEVAL.match(ln)
+        if not m:
+            return False
+        params = self._parse_kv(m.group(1))
+        if "topk" in params:
+            self.retrieval_topk = int(float(params["topk"]))
+        if "gate" in params:
+            self.retrieval_gate = str(params["gate"])
+        if "score" in params:
+            self.retrieval_score = str(params["score"]).lower()
+        for name in self.score_weights:
+            if "w_" + name in params:
+                self.score_weights[name] = float(params["w_" + name])
+        self._audit("parse_retrieval", params)
+        return True
+
+    def _parse_decay_line(self, ln: str) -> bool:
+        # Optional: legacy "decay(...)" line — we parse but do not use directly in min build
+        if not ln.startswith("decay("):
+            return False
+        self._audit("parse_legacy_decay_line", {"line": ln})
+        return True
 
-            # retrieval { gate: E-weighted, topk: 5 }
-            m = re.match(r'^retrieval\s*\{([^}]*)\}\s*$', ln)
-            if m:
-                params = self._parse_kv(m.group(1))
-                if "topk" in params:
-                    self.retrieval_topk = int(float(params["topk"]))
-                if "gate" in params:
-                    self.retrieval_gate = str(params["gate"])
-                self._audit("parse_retrieval", params)
+    def _parse_kv(self, body: str) -> Dict[str, str]:
+        # Parses key=value / key:value pairs where value can be number or "string".
+        # One left-to-right scan: pairs are split by commas not in quotes, text that is
+        # not a pair is skipped, values come back stripped and dequoted.
+        kv: Dict[str, str] = {}
+        n = len(body)
+        i = 0
+        while i < n:
+            if not _is_word(body[i]):
+                i += 1
                 continue
-
-            # Optional: legacy "decay(...)" line — we parse but do not use directly in min build
-            if ln.startswith("decay("):
-                self._audit("parse_legacy_decay_line", {"line": ln})
+            key_start, j = i, i
+            while j < n and _is_word(body[j]):
+                j += 1
+            p = j
+            while p < n and body[p].isspace():
+                p += 1
+            if p == n or body[p] not in ":=":
+                i = j  # a bare word, not a key
                 continue
-
-            # unknown line
-            self._audit("parse_unknown", {"line": ln})
-
-    def _parse_kv(self, body: str) -> Dict[str, str]:
-        # Parses key=value pairs where value can be number or "string"
-        kv = {}
-        # split by commas not in quotes
-        parts = re.findall(r'(\w+)\s*:\s*(".*?"|[^,]+)|(\w+)\s*=\s*(".*?"|[^,]+)', body)
-        # parts is a list of tuples with either (: form) or (= form). Extract both.
-        for a1, a2, b1, b2 in parts:
-            if a1:
-                key = a1.strip()
-                val = a2.strip()
+            v = p + 1
+            while v < n and body[v].isspace():
+                v += 1
+            close = body.find('"', v + 1) if v < n and body[v] == '"' else -1
+            if close != -1 and "\n" not in body[v:close]:
+                val, i = body[v:close + 1], close + 1           # "quoted, may hold commas"
+            elif v < n and body[v] != ",":
+                end = body.find(",", v)
+                end = n if end == -1 else end
+                val, i = body[v:end].strip(), end               # bare value up to the comma
+            elif v > p + 1:
+                val, i = "", v                                  # key = <blanks>,
             else:
-                key = b1.strip()
-                val = b2.strip()
-            kv[key] = val.strip().strip(",")
-        # dequote
-        for k, v in list(kv.items()):
-            if isinstance(v, str) and len(v) >= 2 and v[0] in ["'", '"'] and v[-1] == v[0]:
-                kv[k] = v[1:-1]
+                i = j  # key with nothing after the separator
+                continue
+            if len(val) >= 2 and val[0] in ("'", '"') and val[-1] == val[0]:
+                val = val[1:-1]
+            kv[body[key_start:j]] = val
         return kv
 
     def _audit(self, typ: str, data: Dict[str, Any]) -> None:
-        self.audit_log.append({"stage": "parser", "type": typ, "data": data})
+        self.audit_log.append(AuditEntry("parser", typ, data))
+
+    @property
+    def audit_records(self) -> Iterator[Dict[str, Any]]:
+        """audit_log as dicts: parser entries keep a 'data' key, engine entries are flat."""
+        for e in self.audit_log:
+            if e.stage == "parser":
+                yield {"stage": e.stage, "type": e.type, "data": e.data}
+            else:
+                yield {"stage": e.stage, "type": e.type, **e.data}
 
     # ----- Helpers -----
     @staticmethod
@@ -208,142 +476,318 @@ class LetheEngine:
 
     @staticmethod
     def _parse_days(ts: Optional[str]) -> Optional[float]:
-        if not ts:
-            return None
-        try:
-            dt = datetime.strptime(ts, "%Y-%m-%d").replace(tzinfo=timezone.utc)
-            return dt.timestamp() / 86400.0
-        except Exception:
+        if not ts or not isinstance(ts, str):
             return None
+        return _iso_days(ts)
+
+    @staticmethod
+    def _lc_tags(m: dict) -> Tuple[str, ...]:
+        """Lowered tags of m, in original order."""
+        return tuple(_lc_name(t) for t in m.get("tags") or [])
+
+    @staticmethod
+    def _lowered(m: dict) -> Tuple[str, Tuple[str, ...], str]:
+        """Return lowered (content, tags, topic) of m; nothing is cached on the dict."""
+        return (m.get("content") or "").lower(), LetheEngine._lc_tags(m), _lc_name(m.get("topic") or "")
 
     def _emotion_for(self, m: dict) -> Emotion:
-        name = (m.get("emotion") or "neutral").lower()
+        name = _lc_name(m.get("emotion") or "neutral")
         return self.emotions.get(name, self.emotions["neutral"])
 
-    def _apply_time_decay(self, m: dict) -> None:
-        """Apply time decay to m['weight'] based on its timestamp and emotion kernel."""
-        t_now = self._now_days()
+    def _apply_time_decay(self, m: dict, t_now: Optional[float] = None) -> None:
+        """Apply time decay to m['weight'] based on its timestamp and emotion kernel.
+
+        Scalar path for a single item; search() decays whole columns at once through
+        _decayed_weights / _decay_all. Pass t_now (days, from _now_days()) when
+        decaying many items in one call.
+        """
+        if t_now is None:
+            t_now = self._now_days()
         t_item = self._parse_days(m.get("timestamp"))
         if t_item is None:
             return  # no timestamp → no decay
         dt_days = max(0.0, t_now - t_item)
         emo = self._emotion_for(m)
         w0 = float(m.get("weight", 0.5))
-        # choose kernel
-        if emo.decay_fn == "exponential":
-            f = decay_exponential(emo.lam, dt_days)
-        elif emo.decay_fn == "power_law":
-            k = float(emo.params.get("k", 1.0))
+        fn_id, lam, k, t0 = _kernel_params(emo)
+        if fn_id == DECAY_POWER_LAW:
             f = decay_power_law(k, dt_days)
-        elif emo.decay_fn == "sigmoid":
-            k = float(emo.params.get("k", 1.0)); t0 = float(emo.params.get("t0", 7.0))
+        elif fn_id == DECAY_SIGMOID:
             f = decay_sigmoid(k, t0, dt_days)
-        elif emo.decay_fn == "tanh":
-            k = float(emo.params.get("k", 0.3)); t0 = float(emo.params.get("t0", 7.0))
+        elif fn_id == DECAY_TANH:
             f = decay_tanh(k, t0, dt_days)
         else:
-            f = decay_exponential(emo.lam, dt_days)
+            f = decay_exponential(lam, dt_days)
         m["weight"] = apply_decay_with_floor(w0, emo.floor, f)
 
+    def _index(self, memories: List[dict]) -> MemoryIndex:
+        """Return the column view of memories, reusing the cached one while it is still valid."""
+        raw = [_raw_fields(m) for m in memories]
+        ekey = self._emotions_key()
+        idx = self._indexes.get(id(memories))
+        if idx is not None and idx.source is memories and idx.emotions_key == ekey and idx.raw == raw:
+            self._indexes.move_to_end(id(memories))
+            return idx
+        weights, stamps, lam, floor, fn_id, k, t0, texts = [], [], [], [], [], [], [], []
+        groups: Tuple[List[int], ...] = ([], [], [], [])
+        topic_index: Dict[str, Set[int]] = {}
+        tag_index: Dict[str, Set[int]] = {}
+        tok_index: Dict[str, Set[int]] = {}
+        kernels: Dict[int, Tuple[int, float, float, float]] = {}   # id(emotion) -> kernel params
+        for i, m in enumerate(memories):
+            emo = self._emotion_for(m)
+            kp = kernels.get(id(emo))
+            if kp is None:
+                kp = kernels[id(emo)] = _kernel_params(emo)
+            t_item = self._parse_days(m.get("timestamp"))
+            weights.append(float(m.get("weight", 0.5)))
+            stamps.append(t_item)
+            fn_id.append(kp[0]); lam.append(kp[1]); k.append(kp[2]); t0.append(kp[3])
+            floor.append(emo.floor)
+            text, tg, topic = self._lowered(m)
+            texts.append(text)
+            if t_item is not None:
+                groups[kp[0]].append(i)
+            topic_index.setdefault(topic, set()).add(i)
+            for t in frozenset(tg):
+                tag_index.setdefault(t, set()).add(i)
+            for tok in text.split():
+                tok_index.setdefault(tok, set()).add(i)
+        idx = MemoryIndex(memories, raw, ekey, weights, stamps, lam, floor, fn_id, k, t0, texts, groups,
+                          topic_index, tag_index, tok_index)
+        self._indexes[id(memories)] = idx
+        self._indexes.move_to_end(id(memories))
+        while len(self._indexes) > INDEX_CACHE_SIZE:
+            self._indexes.popitem(last=False)
+        return idx
+
+    def _emotions_key(self) -> tuple:
+        """Snapshot of self.emotions; a cached view is stale once this differs from its own."""
+        return tuple((name, id(e), e.lam, e.floor, e.decay_fn, tuple(sorted(e.params.items())))
+                     for name, e in self.emotions.items())
+
+    def invalidate(self) -> None:
+        """Drop the cached column views; parse() calls this."""
+        self._indexes.clear()
+
+    @staticmethod
+    def _decayed_weights(idx: MemoryIndex, t_now: float) -> List[float]:
+        """Decayed weight column of idx, recomputed only when t_now enters a new bucket."""
+        bucket = int(t_now * DECAY_BUCKETS_PER_DAY)
+        if idx.decayed is None or idx.decay_bucket != bucket:
+            decayed = list(idx.weights)
+            _decay_all(idx.kernel_groups, idx.timestamps_days, idx.lam, idx.k, idx.t0,
+                       idx.floor, idx.weights, t_now, decayed)
+            idx.decayed, idx.decay_bucket = decayed, bucket
+        return idx.decayed
+
+    @staticmethod
+    def _recency(idx: MemoryIndex, t_now: float) -> List[float]:
+        """Clamped 0..1 decay factor per column (1.0 when undated), bucketed like the weights."""
+        bucket = int(t_now * DECAY_BUCKETS_PER_DAY)
+        if idx.recency is None or idx.recency_bucket != bucket:
+            n = len(idx.weights)
+            ones = [1.0] * n
+            recency = list(ones)
+            # w0 = 1 and floor = 0 make the driver return the clamped factor itself
+            _decay_all(idx.kernel_groups, idx.timestamps_days, idx.lam, idx.k, idx.t0,
+                       [0.0] * n, ones, t_now, recency)
+            idx.recency, idx.recency_bucket = recency, bucket
+        return idx.recency
+
+    def _composite_scores(self, idx: MemoryIndex, matches: List[float],
+                          importance: List[float], t_now: float) -> List[float]:
+        """Weighted feature sum per column, z-scored and passed through a sigmoid (0..1)."""
+        n = len(matches)
+        if not n:
+            return []
+        w = self.score_weights
+        ws, wr, wf, wi = w.get("sem", 0.0), w.get("rec", 0.0), w.get("freq", 0.0), w.get("imp", 0.0)
+        rec = self._recency(idx, t_now)
+        if idx.freq is None:
+            idx.freq = [_access_count(m) for m in idx.source]
+        fmax = max(idx.freq) or 1.0
+        raw = [ws * (mt / 0.5) + wr * r + wf * (f / fmax) + wi * imp
+               for mt, r, f, imp in zip(matches, rec, idx.freq, importance)]
+        mu = math.fsum(raw) / n
+        sd = math.sqrt(math.fsum((x - mu) ** 2 for x in raw) / n) + 1e-9
+        exp = math.exp
+        # |z| is clamped so exp() cannot overflow on huge, nearly constant inputs
+        return [1.0 / (1.0 + exp(-max(-60.0, min(60.0, (x - mu) / sd)))) for x in raw]
+
     # ----- Public API -----
     def search(self, memories: List[dict], query: str) -> List[dict]:
         """Return top-k items matching query, after applying time decay to their weights."""
-        scored = []
         q = (query or "").lower()
-        for m in memories:
-            m = dict(m)  # shallow copy
-            # ensure weight
+        idx = self._index(memories)
+        t_now = self._now_days()
+        decayed = self._decayed_weights(idx, t_now)
+        # candidates from the postings; everything else scores on weight alone
+        tag_hits = idx.tag_index.get(q, set())
+        cand = (idx.content_hits(q) | idx.topic_index.get(q, set()) | tag_hits) if q else set()
+        # simple matching score as 0/1 masks: 0.25 for any hit, another 0.25 for a tag hit
+        n = len(memories)
+        mask_any, mask_tag = bytearray(n), bytearray(n)
+        for i in cand:
+            mask_any[i] = 1
+        for i in tag_hits:
+            mask_tag[i] = 1
+        if self.retrieval_score == "composite":
+            matches = [0.25 * a + 0.25 * t for a, t in zip(mask_any, mask_tag)]
+            scores = self._composite_scores(idx, matches, decayed, t_now)
+        else:
+            # weight + match fused into one pass over the columns
+            scores = [w + (0.25 * a + 0.25 * t) for w, a, t in zip(decayed, mask_any, mask_tag)]
+        topk = self.retrieval_topk
+        if 0 <= topk < n:
+            # O(N log k) partial selection; same order as a stable descending sort
+            top = heapq.nlargest(topk, range(n), key=scores.__getitem__)
+        else:
+            top = sorted(range(n), key=scores.__getitem__, reverse=True)[:topk]
+        # only the survivors are materialised as (shallow) copies
+        stamps = idx.timestamps_days
+        out = []
+        for i in top:
+            m = dict(memories[i])
             m.setdefault("weight", 0.5)
-            # decay by time+emotion
-            self._apply_time_decay(m)
-            text = (m.get("content") or "") .lower()
-            tags = [t.lower() for t in m.get("tags") or []]
-            topic = (m.get("topic") or "").lower()
-            # simple matching score
-            match = 0.0
-            if q and (q in text or q in tags or q == topic):
-                match = 0.25
-            if q in tags:
-                match += 0.25
-            score = float(m["weight"]) + match
-            scored.append((score, m))
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return [m for _, m in scored[: self.retrieval_topk]]
+            if stamps[i] is not None:
+                m["weight"] = decayed[i]
+            if self.retrieval_score == "composite":
+                m["score"] = scores[i]
+            out.append(m)
+        return out
+
+    def compile(self) -> None:
+        """Rebuild the rule plan from the current rule lists (parse() calls this).
+
+        The plan holds one bound step per rule kind that actually has rules, with
+        constants (lowered tags/gates, audit reasons, attenuation factor) folded in, so
+        apply_rules() does no per-call work for absent rule kinds. apply_rules() calls it
+        again whenever forget_rules / reinforce_rules / interfere_rule were edited since.
+        """
+        plan: List[Callable[..., None]] = []
+        if self.forget_rules:
+            forget = tuple((fr.trust_lt, fr.topic, fr.keep_log, f"trust<{fr.trust_lt}")
+                           for fr in self.forget_rules)
+            plan.append(partial(self._step_forget, forget))
+        self._reinforce_by_event = {}
+        for rr in self.reinforce_rules:
+            if rr.tag:
+                gate = sys.intern(rr.emotion_gate.lower()) if rr.emotion_gate is not None else None
+                self._reinforce_by_event.setdefault(rr.event_eq, []).append((rr, sys.intern(rr.tag.lower()), gate))
+        if self._reinforce_by_event:
+            plan.append(partial(self._step_reinforce, self._reinforce_by_event))
+        if self.interfere_rule:
+            ir = self.interfere_rule
+            plan.append(partial(self._step_interfere, ir.match == "topic", ir.alpha, 1.0 - ir.alpha))
+        self._plan = plan
+        self._plan_key = self._rules_key()
+
+    def _rules_key(self) -> tuple:
+        """Field snapshot of the rule lists; the plan is stale once this differs from _plan_key."""
+        ir = self.interfere_rule
+        return (tuple(map(astuple, self.forget_rules)), tuple(map(astuple, self.reinforce_rules)),
+                astuple(ir) if ir else None)
 
     def apply_rules(self, memories: List[dict], context: Dict[str, Any]) -> List[dict]:
-        out = [dict(m) for m in memories]
+        """Return memories with forget/reinforce/interference applied; input dicts are not modified.
+
+        The result is copy-on-write: items no rule touched are the caller's own dicts.
+        """
+        if self._rules_key() != self._plan_key:
+            self.compile()  # rules were added or edited in code since the last compile
+        out = list(memories)
+
+        def own(i: int) -> dict:
+            # copy an item the first time a rule changes it
+            m = out[i]
+            if m is memories[i]:
+                m = out[i] = dict(m)
+            return m
+
+        for step in self._plan:
+            step(out, own, context)
+        return out
+
+    # ----- Rule steps (bound into the plan by compile()) -----
+    def _step_forget(self, rules, out: List[dict], own, context: Dict[str, Any]) -> None:
         # Forget rule on trust
         trust = float(context.get("trust_level", context.get("trust", 1.0)))
-        for fr in self.forget_rules:
-            if trust < fr.trust_lt:
-                for m in out:
-                    tags = m.get("tags") or []
-                    topic = (m.get("topic") or "")
-                    # match if topic equals or if tag list contains exact topic string
-                    if topic == fr.topic or fr.topic in tags:
-                        w0 = float(m.get("weight", 0.5))
-                        m["weight"] = max(0.1, w0 * 0.5)  # simple attenuation
-                        if fr.keep_log:
-                            self.audit_log.append({
-                                "stage": "engine", "type": "forget",
-                                "reason": f"trust<{fr.trust_lt}", "match": fr.topic,
-                                "id": m.get("id"), "before": w0, "after": m["weight"]
-                            })
-
+        active = [r for r in rules if trust < r[0]]
+        if not active:
+            return
+        # positions per exact topic / tag, so each rule only visits memories it can hit
+        by_topic: Dict[str, List[int]] = {}
+        by_tag: Dict[str, List[int]] = {}
+        for i, m in enumerate(out):
+            by_topic.setdefault(m.get("topic") or "", []).append(i)
+            for t in m.get("tags") or []:
+                by_tag.setdefault(t, []).append(i)
+        log = self.audit_log
+        for _, topic, keep_log, reason in active:
+            # match if topic equals or if tag list contains exact topic string
+            hits = sorted(set(by_topic.get(topic, ())) | set(by_tag.get(topic, ())))
+            for i in hits:
+                m = own(i)
+                w0 = float(m.get("weight", 0.5))
+                m["weight"] = max(0.1, w0 * 0.5)  # simple attenuation
+                if keep_log:
+                    log.append(AuditEntry("engine", "forget", {
+                        "reason": reason, "match": topic,
+                        "id": m.get("id"), "before": w0, "after": m["weight"]
+                    }))
+
+    def _step_reinforce(self, by_event, out: List[dict], own, context: Dict[str, Any]) -> None:
         # Reinforce rule on event
-        event = str(context.get("event") or "")
-        for rr in self.reinforce_rules:
-            if rr.event_eq == event:
-                for m in out:
-                    tags = [t.lower() for t in (m.get("tags") or [])]
-                    emo_name = (m.get("emotion") or "neutral").lower()
-                    if rr.tag and rr.tag.lower() in tags:
-                        if (rr.emotion_gate is None) or (emo_name == rr.emotion_gate.lower()):
-                            w0 = float(m.get("weight", 0.5))
-                            m["weight"] = min(1.0, w0 + rr.by)
-                            self.audit_log.append({
-                                "stage": "engine", "type": "reinforce",
-                                "event": rr.event_eq, "tag": rr.tag, "by": rr.by,
-                                "id": m.get("id"), "before": w0, "after": m["weight"]
-                            })
-
+        rules = by_event.get(str(context.get("event") or ""), ())
+        if not rules:
+            return
+        by_lc_tag: Dict[str, List[int]] = {}
+        for i, m in enumerate(out):
+            for t in frozenset(self._lc_tags(m)):
+                by_lc_tag.setdefault(t, []).append(i)
+        log = self.audit_log
+        for rr, tag, gate in rules:
+            for i in by_lc_tag.get(tag, ()):
+                if (gate is None) or (_lc_name(out[i].get("emotion") or "neutral") == gate):
+                    m = own(i)
+                    w0 = float(m.get("weight", 0.5))
+                    m["weight"] = min(1.0, w0 + rr.by)
+                    log.append(AuditEntry("engine", "reinforce", {
+                        "event": rr.event_eq, "tag": rr.tag, "by": rr.by,
+                        "id": m.get("id"), "before": w0, "after": m["weight"]
+                    }))
+
+    def _step_interfere(self, by_topic: bool, alpha: float, keep: float,
+                        out: List[dict], own, context: Dict[str, Any]) -> None:
         # Interference (lightweight): for items sharing tag/topic with a "newest" item, attenuate older ones a bit
-        if self.interfere_rule:
-            # pick newest item per (topic or first tag) and attenuate others
-            # parse timestamps to sort
-            def ts_days(m):
-                d = self._parse_days(m.get("timestamp"))
-                return d if d is not None else -1e9  # unknown timestamps go very old
-            out_sorted = sorted(out, key=ts_days, reverse=True)
-            seen_keys = set()
-            for nm in out_sorted:
-                key = None
-                if self.interfere_rule.match == "topic":
-                    key = (nm.get("topic") or "").lower()
-                else:
-                    # first tag if exists
-                    tg = nm.get("tags") or []
-                    key = (tg[0].lower() if tg else "")
-                if not key:
-                    continue
-                if key in seen_keys:
+        def ts_days(m, parse_days=self._parse_days):
+            d = parse_days(m.get("timestamp"))
+            return d if d is not None else -1e9  # unknown timestamps go very old
+        # one pass: newest (ts, position) per key, first one wins ties; members per key
+        newest: Dict[str, Tuple[float, int]] = {}
+        members: Dict[str, List[int]] = {}
+        for i, m in enumerate(out):
+            tg, topic = self._lc_tags(m), _lc_name(m.get("topic") or "")
+            # first tag if exists
+            key = topic if by_topic else (tg[0] if tg else "")
+            if key:
+                t = ts_days(m)
+                best = newest.get(key)
+                if best is None or t > best[0]:
+                    newest[key] = (t, i)
+            for k in ((topic,) if by_topic else frozenset(tg)):
+                members.setdefault(k, []).append(i)
+        # keys in newest-first order (only K keys are ordered, not all N memories)
+        log = self.audit_log
+        for key, (_, ni) in sorted(newest.items(), key=lambda kv: (-kv[1][0], kv[1][1])):
+            for i in members[key]:
+                if i == ni:
                     continue
-                # this is the "newest" for that key
-                seen_keys.add(key)
-                for m in out:
-                    if m is nm:
-                        continue
-                    if self.interfere_rule.match == "topic":
-                        same = (m.get("topic") or "").lower() == key
-                    else:
-                        same = key in [t.lower() for t in (m.get("tags") or [])]
-                    if same:
-                        w0 = float(m.get("weight", 0.5))
-                        m["weight"] = max(0.0, w0 * (1.0 - self.interfere_rule.alpha))
-                        self.audit_log.append({
-                            "stage": "engine", "type": "interference",
-                            "key": key, "alpha": self.interfere_rule.alpha,
-                            "id": m.get("id"), "before": w0, "after": m["weight"]
-                        })
-
-        return out
+                m = own(i)
+                w0 = float(m.get("weight", 0.5))
+                m["weight"] = max(0.0, w0 * keep)
+                log.append(AuditEntry("engine", "interference", {
+                    "key": key, "alpha": alpha,
+                    "id": m.get("id"), "before": w0, "after": m["weight"]
+                }))
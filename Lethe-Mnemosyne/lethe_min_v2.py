@@ -16,12 +16,15 @@ CLI:
   python lethe_min_v2.py retrieve --mem memories.json --ctx context.json --dsl example_v3.lethe --query "..." [--topk 7]
 Input data (memories.json): list of {id?, text, topic?, tags?, timestamp?, weight?, trust?}
 """
-import argparse, json, re, time, math, csv, sys
-from collections import defaultdict
+import argparse, json, re, time, math, csv, sys, heapq
+from collections import Counter, defaultdict
 from datetime import datetime
+from functools import lru_cache
 
 # ---------- Utilities ----------
 
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)  # shared by documents and queries
+
 def now_ts(ctx):
     # Allow ctx["now_ts"] or ctx["now"] (iso), else current time
     if isinstance(ctx, dict):
@@ -34,24 +37,29 @@ def now_ts(ctx):
                 pass
     return time.time()
 
+@lru_cache(maxsize=4096)
+def _iso_ts(s):
+    # memoised: many memories share a timestamp, and expire re-reads them on every pass
+    return datetime.fromisoformat(s).timestamp()
+
 def ts_of(x):
     if x is None: return 0.0
     try:
         if isinstance(x,(int,float)): return float(x)
-        return datetime.fromisoformat(str(x)).timestamp()
+        return _iso_ts(str(x))
     except Exception:
         return 0.0
 
-def match_mem(m, kind, key):
-    key = str(key).lower()
-    if kind == "topic":
-        return str(m.get("topic","")).lower() == key
-    if kind == "tag":
-        tags = m.get("tags",[]) or []
-        return any(str(t).lower()==key for t in tags)
-    if kind == "keyword":
-        return key in (m.get("text","") or "").lower()
-    return False
+def rule_key(r):
+    # interned, like the cached memory fields, so bucket lookups hit on identity
+    return sys.intern(str(r["key"]).lower())
+
+def cache_lc(m):
+    # lower-cased copies of the matchable fields, computed once per memory
+    m["_topic_lc"] = sys.intern(str(m.get("topic","")).lower())
+    m["_tags_lc"] = frozenset(sys.intern(str(t).lower()) for t in (m.get("tags") or []))
+    m["_text_lc"] = (m.get("text") or "").lower()
+    return m
 
 def ensure_defaults(m):
     m.setdefault("weight", 1.0)
@@ -73,12 +81,31 @@ class DSL:
         self.synonyms = defaultdict(list) # alias -> list[str]
         self.retrieve_topk = 7
 
+    # One compiled pattern per statement, each wrapped in a group named after it and using
+    # uniquely named groups inside, so they also compose into _RULE_RE below.
+    _EXPIRE_RE = re.compile(r'(?P<expire>expire\s+(?P<ex_kind>topic|tag|keyword):"(?P<ex_key>[^"]+)"\s+after:(?P<ex_num>[0-9]+)(?P<ex_unit>[dh])\s+action:(?P<ex_action>shield|remove)$)')
+    _PIN_RE = re.compile(r'(?P<pin>pin\s+(?P<pin_kind>topic|tag):"(?P<pin_key>[^"]+)"\s+priority:(?P<pin_prio>[0-9.]+)$)')
+    _REINFORCE_RE = re.compile(r'(?P<reinforce>rule\s+on\s+event\s*==\s*"(?P<re_event>[^"]+)"(?:.*?)->\s*reinforce\s+(?P<re_kind>topic|tag):"(?P<re_key>[^"]+)"\s+by\s+(?P<re_by>[0-9.]+)(?:\s+cap:(?P<re_cap>[0-9.]+))?(?:\s+cooldown:(?P<re_cooldown>[0-9]+)h)?\s*$)')
+    # trailing text after the key is ignored, as before
+    _TRUST_RE = re.compile(r'(?P<trust>rule\s+on\s+trust\s*<\s*(?P<tf_threshold>[0-9.]+)\s*->\s*forget\s+(?P<tf_kind>topic|tag):"(?P<tf_key>[^"]+)")')
+    _TOPK_RE = re.compile(r'(?P<topk>topk\s*:\s*(?P<topk_n>[0-9]+)$)')
+    _SYN_RE = re.compile(r'(?P<syn>synonyms(?:\s*:\s*|\s+)(?P<syn_alias>[A-Za-z0-9_\-]+)\s*=\s*\[(?P<syn_list>.*?)\]\s*$)')
+    # All statements in one alternation; m.lastgroup names the branch that matched.
+    _RULE_RE = re.compile("|".join(p.pattern for p in (
+        _EXPIRE_RE, _PIN_RE, _REINFORCE_RE, _TRUST_RE, _TOPK_RE, _SYN_RE)))
+
     @staticmethod
     def _parse_duration(num, unit):
         num = int(num)
         if unit.lower() == "h": return num * 3600
         return num * 86400
 
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def parse_cached(text):
+        # one shared DSL per distinct text, for long-running callers; treat it as read-only
+        return DSL().parse(text)
+
     def parse(self, text):
         in_retrieval = False
         for raw in text.splitlines():
@@ -94,85 +121,49 @@ class DSL:
                 in_retrieval = False
                 continue
 
+            # one scan per line; the named branch that matched tells us the statement
+            m = DSL._RULE_RE.match(ln)
+            kind = m.lastgroup if m else None
+
             if in_retrieval:
                 # topk:X
-                m = re.match(r'^topk\s*:\s*([0-9]+)$', ln)
-                if m:
-                    self.retrieve_topk = int(m.group(1))
-                    continue
-                # synonyms:name=["a","b"]
-                m = re.match(r'^synonyms\s*:\s*([A-Za-z0-9_\-]+)\s*=\s*\[(.*?)\]\s*$', ln)
-                if m:
-                    alias = m.group(1)
-                    lst = [x.strip().strip('"\'') for x in m.group(2).split(",") if x.strip()]
-                    self.synonyms[alias].extend([x for x in lst if x])
-                    continue
-                # synonyms support-thread=["check-in","mentor"]
-                m = re.match(r'^synonyms\s+([A-Za-z0-9_\-]+)\s*=\s*\[(.*?)\]\s*$', ln)
-                if m:
-                    alias = m.group(1)
-                    lst = [x.strip().strip('"\'') for x in m.group(2).split(",") if x.strip()]
+                if kind == "topk":
+                    self.retrieve_topk = int(m.group("topk_n"))
+                # synonyms:name=["a","b"]  /  synonyms support-thread=["check-in","mentor"]
+                elif kind == "syn":
+                    alias = m.group("syn_alias")
+                    lst = [x.strip().strip('"\'') for x in m.group("syn_list").split(",") if x.strip()]
                     self.synonyms[alias].extend([x for x in lst if x])
-                    continue
                 # ignore others inside block
                 continue
 
-            # expire
-            m = re.match(r'^expire\s+(topic|tag|keyword):"([^"]+)"\s+after:([0-9]+)([dh])\s+action:(shield|remove)$', ln)
-            if m:
+            if kind == "expire":
                 self.expire_rules.append({
-                    "kind": m.group(1), "key": m.group(2),
-                    "ttl": DSL._parse_duration(m.group(3), m.group(4)),
-                    "action": m.group(5)
+                    "kind": m.group("ex_kind"), "key": sys.intern(m.group("ex_key")),
+                    "ttl": DSL._parse_duration(m.group("ex_num"), m.group("ex_unit")),
+                    "action": m.group("ex_action")
                 })
-                continue
-
-            # pin
-            m = re.match(r'^pin\s+(topic|tag):"([^"]+)"\s+priority:([0-9.]+)$', ln)
-            if m:
+            elif kind == "pin":
                 self.pin_rules.append({
-                    "kind": m.group(1), "key": m.group(2),
-                    "prio": float(m.group(3))
+                    "kind": m.group("pin_kind"), "key": sys.intern(m.group("pin_key")),
+                    "prio": float(m.group("pin_prio"))
                 })
-                continue
-
-            # reinforce rule
-            m = re.match(
-                r'^rule\s+on\s+event\s*==\s*"([^"]+)"(?:.*?)->\s*reinforce\s+(topic|tag):"([^"]+)"\s+by\s+([0-9.]+)(?:\s+cap:([0-9.]+))?(?:\s+cooldown:([0-9]+)h)?\s*$',
-                ln
-            )
-            if m:
+            elif kind == "reinforce":
                 self.reinforce_rules.append({
-                    "event": m.group(1),
-                    "kind": m.group(2),
-                    "key": m.group(3),
-                    "by": float(m.group(4)),
-                    "cap": float(m.group(5) or 1.0),
-                    "cooldown": int(m.group(6) or 0) * 3600
+                    "event": sys.intern(m.group("re_event")),
+                    "kind": m.group("re_kind"),
+                    "key": sys.intern(m.group("re_key")),
+                    "by": float(m.group("re_by")),
+                    "cap": float(m.group("re_cap") or 1.0),
+                    "cooldown": int(m.group("re_cooldown") or 0) * 3600
                 })
-                continue
-
-            # trust-forget
-            m = re.match(r'^rule\s+on\s+trust\s*<\s*([0-9.]+)\s*->\s*forget\s+(topic|tag):"([^"]+)"', ln)
-            if m:
-                self.trust_forget_rules.append({
-                    "threshold": float(m.group(1)),
-                    "kind": "topic" if m.group(2) is None else m.group(2),
-                    "key": m.group(3) if m.lastindex>=3 else "",
-                    "action": "forget"
-                })
-                # robust parse alt form
-                continue
-
-            m = re.match(r'^rule\s+on\s+trust\s*<\s*([0-9.]+)\s*->\s*forget\s+(topic|tag):"([^"]+)"(?:.*)$', ln)
-            if m:
+            elif kind == "trust":
                 self.trust_forget_rules.append({
-                    "threshold": float(m.group(1)),
-                    "kind": m.group(2),
-                    "key": m.group(3),
+                    "threshold": float(m.group("tf_threshold")),
+                    "kind": m.group("tf_kind"),
+                    "key": sys.intern(m.group("tf_key")),
                     "action": "forget"
                 })
-                continue
 
         return self
 
@@ -180,37 +171,115 @@ class DSL:
 
 class Engine:
     def __init__(self, memories, ctx, dsl: DSL):
-        self.memories = [ensure_defaults(dict(m)) for m in memories]
+        self.memories = [cache_lc(ensure_defaults(dict(m))) for m in memories]
         self.ctx = ctx or {}
         self.dsl = dsl
-        self.audit = []
+        # audit log as parallel columns; rules are referenced by index into self._rules
+        self.audit = {"at":[], "type":[], "id":[], "rule_idx":[], "prev":[], "new":[]}
+        self._rules = []
+        self._rule_idx = {}  # id(rule dict) -> index into self._rules
+        self._vocab = None  # term index, built by _build_term_index on the first retrieval
+        self._build_match_index()
+        # retrieval caches, valid while the visibility mask is unchanged (see _visible)
+        self._mask = None
+        self._term_cache = {}
+
+    def _build_term_index(self):
+        # Sparse term-document view, built once on first use (run never retrieves): vocab
+        # term -> id, and per term id a postings list of (memory index, tf/len) — i.e. the
+        # rows of a CSR tf matrix.
+        self._vocab = {}
+        self._postings = []
+        for i, m in enumerate(self.memories):
+            words = _TOKEN_RE.findall(m["_text_lc"])
+            if not words: continue
+            L = float(len(words))
+            for w, c in Counter(words).items():
+                tid = self._vocab.get(w)
+                if tid is None:
+                    tid = self._vocab[w] = len(self._postings)
+                    self._postings.append([])
+                self._postings[tid].append((i, c/L))
+
+    def _build_match_index(self):
+        # topic / tag -> indices of the memories carrying it; rules then visit only their hits
+        self._by_topic = defaultdict(list)
+        self._by_tag = defaultdict(list)
+        self._by_keyword = {}  # filled on demand by _index_keywords
+        for i, m in enumerate(self.memories):
+            self._by_topic[m["_topic_lc"]].append(i)
+            for t in m["_tags_lc"]: self._by_tag[t].append(i)
+
+    def _index_keywords(self, keys):
+        # All keyword keys in one scan per text: a lookahead alternation (longest key first)
+        # reports, at each position, the longest key starting there; every key contained in
+        # a reported one is then present too, so `inside` closes the hit set.
+        keys = sorted({k for k in keys if k not in self._by_keyword}, key=len, reverse=True)
+        if not keys: return
+        inside = {k: [j for j in keys if j in k] for k in keys}
+        rx = re.compile("(?=(%s))" % "|".join(map(re.escape, keys)))
+        hits = {k: [] for k in keys}
+        for i, m in enumerate(self.memories):
+            found = set()
+            for k in set(rx.findall(m["_text_lc"])): found.update(inside[k])
+            for k in found: hits[k].append(i)
+        self._by_keyword.update(hits)
+
+    def _matching(self, kind, key):
+        # indices of memories a (kind, lower-cased key) rule applies to, in memory order
+        if kind == "topic": return self._by_topic.get(key, ())
+        if kind == "tag": return self._by_tag.get(key, ())
+        if kind == "keyword":
+            if key not in self._by_keyword: self._index_keywords([key])
+            return self._by_keyword[key]
+        return ()
+
+    # --- Audit ---
+    def _audit(self, typ, mid, r, at, prev="", new=""):
+        ix = self._rule_idx.get(id(r))
+        if ix is None:
+            ix = self._rule_idx[id(r)] = len(self._rules)
+            self._rules.append(r)
+        a = self.audit
+        a["at"].append(at); a["type"].append(typ); a["id"].append(mid)
+        a["rule_idx"].append(ix); a["prev"].append(prev); a["new"].append(new)
+
+    def audit_rows(self):
+        # CSV rows [at, type, memory_id, rule, prev_weight, new_weight]; each rule and
+        # each distinct timestamp is formatted once, however many events refer to it
+        a = self.audit
+        rule_json = [json.dumps(r, ensure_ascii=False) for r in self._rules]
+        stamp = {at: datetime.fromtimestamp(at).isoformat(timespec="seconds") for at in set(a["at"])}
+        return [[stamp[at], typ, mid, rule_json[ix], prev, new]
+                for at, typ, mid, ix, prev, new in zip(a["at"], a["type"], a["id"], a["rule_idx"], a["prev"], a["new"])]
 
     # --- Rule applications ---
     def apply_expire(self):
         now = now_ts(self.ctx)
+        self._index_keywords(rule_key(r) for r in self.dsl.expire_rules if r["kind"] == "keyword")
         for r in self.dsl.expire_rules:
-            for m in self.memories:
-                if match_mem(m, r["kind"], r["key"]):
-                    age = now - ts_of(m.get("timestamp"))
-                    if age >= r["ttl"]:
-                        if r["action"] == "remove":
-                            prev = m.get("weight", 1.0)
-                            m["weight"] = 0.0
-                            self.audit.append({"type":"expire_remove","id":m.get("id"),"prev_weight":prev,"rule":r,"at":now})
-                        else:
-                            if not m.get("shielded"):
-                                m["shielded"] = True
-                                self.audit.append({"type":"expire_shield","id":m.get("id"),"rule":r,"at":now})
+            for i in self._matching(r["kind"], rule_key(r)):
+                m = self.memories[i]
+                if now - ts_of(m.get("timestamp")) >= r["ttl"]:
+                    if r["action"] == "remove":
+                        prev = m.get("weight", 1.0)
+                        m["weight"] = 0.0
+                        self._audit("expire_remove", m.get("id"), r, now, prev=prev)
+                    else:
+                        if not m.get("shielded"):
+                            m["shielded"] = True
+                            self._audit("expire_shield", m.get("id"), r, now)
 
     def apply_trust_forget(self):
         t = float(self.ctx.get("trust", 1.0))
+        now = now_ts(self.ctx)
         for r in self.dsl.trust_forget_rules:
             if t < r["threshold"]:
-                for m in self.memories:
-                    if match_mem(m, r["kind"], r["key"]):
-                        prev = m.get("weight", 1.0)
-                        m["weight"] = 0.0
-                        self.audit.append({"type":"trust_forget","id":m.get("id"),"prev_weight":prev,"rule":r,"at":now_ts(self.ctx)})
+                for i in self._matching(r["kind"], rule_key(r)):
+                    m = self.memories[i]
+                    prev = m.get("weight", 1.0)
+                    m["weight"] = 0.0
+                    self._audit("trust_forget", m.get("id"), r, now, prev=prev)
 
     def apply_reinforce(self, event_name=None):
         if not event_name: 
@@ -219,45 +288,50 @@ class Engine:
         for r in self.dsl.reinforce_rules:
             if r["event"] != event_name:
                 continue
-            for m in self.memories:
-                if match_mem(m, r["kind"], r["key"]):
-                    last = float(m.get("last_reinforced_ts", 0))
-                    if now - last < r["cooldown"]:
-                        continue
-                    prev = m.get("weight", 1.0)
-                    m["weight"] = min(r["cap"], prev + r["by"])
-                    m["last_reinforced_ts"] = now
-                    self.audit.append({"type":"reinforce","id":m.get("id"),"prev_weight":prev,"new_weight":m["weight"],"rule":r,"at":now})
+            for i in self._matching(r["kind"], rule_key(r)):
+                m = self.memories[i]
+                last = float(m.get("last_reinforced_ts", 0))
+                if now - last < r["cooldown"]:
+                    continue
+                prev = m.get("weight", 1.0)
+                m["weight"] = min(r["cap"], prev + r["by"])
+                m["last_reinforced_ts"] = now
+                self._audit("reinforce", m.get("id"), r, now, prev=prev, new=m["weight"])
 
     # --- Retrieval ---
-    def _idf(self, docs):
-        df = defaultdict(int)
-        N = 0
-        for d in docs:
-            N += 1
-            seen = set()
-            for w in d.split():
-                w = w.strip().lower()
-                if not w: continue
-                if w not in seen:
-                    df[w]+=1; seen.add(w)
-        idf = {}
-        for w,c in df.items():
-            idf[w] = math.log(1.0 + (N/(1.0+c)))
-        return idf
-
-    def _tfidf_score(self, text, query_terms, idf):
-        if not text: return 0.0
-        words = [w.lower() for w in text.split()]
-        if not words: return 0.0
-        tf = defaultdict(int)
-        for w in words: tf[w]+=1
-        L = float(len(words))
-        s = 0.0
-        for q in query_terms:
-            ql = q.lower()
-            s += (tf.get(ql,0)/L) * idf.get(ql, math.log(1.0))
-        return s
+    def _visible(self):
+        # visibility mask, read from the dicts on every call so edits to self.memories count;
+        # the per-term cache is kept only while the mask is unchanged
+        mask = [not m.get("shielded") and m.get("weight",0)>0 for m in self.memories]
+        if mask != self._mask:
+            self._mask = mask
+            self._term_cache = {}  # tid -> (visible postings, idf)
+        return self._mask
+
+    def _tfidf_scores(self, q_terms, visible):
+        """TF-IDF of every memory against q_terms; idf is taken over the visible set.
+
+        Only the postings of the query terms are touched (a sparse mat-vec); terms are
+        accumulated in query order, so results match the per-document formula exactly.
+        visible is the mask from _visible(); a term's visible postings and idf are kept
+        while that mask is unchanged.
+        """
+        if self._vocab is None: self._build_term_index()
+        scores = [0.0] * len(self.memories)
+        vocab, postings, seen = self._vocab, self._postings, self._term_cache
+        N = None
+        for q in (t for term in q_terms for t in _TOKEN_RE.findall(term.lower())):
+            tid = vocab.get(q)
+            if tid is None: continue
+            hit = seen.get(tid)
+            if hit is None:
+                if N is None: N = max(1, sum(visible))
+                post = [p for p in postings[tid] if visible[p[0]]]
+                hit = seen[tid] = (post, math.log(1.0 + (N/(1.0+len(post)))) if post else 0.0)
+            post, idf = hit
+            for i, tfn in post:
+                scores[i] += tfn * idf
+        return scores
 
     def _expand_query(self, q):
         parts = [p.strip() for p in q.split() if p.strip()]
@@ -269,29 +343,28 @@ class Engine:
 
     def retrieve(self, query, topk=None):
         topk = topk or self.dsl.retrieve_topk
-        # Build IDF on visible docs
-        visible = [m for m in self.memories if not m.get("shielded") and m.get("weight",0)>0]
-        idf = self._idf([m.get("text","") or "" for m in visible] or [""])
+        mask = self._visible()
         q_terms = self._expand_query(query or "")
-        results = []
-        for m in visible:
-            base = float(m.get("weight",1.0)) * float(max(0.0, m.get("trust",1.0)))
-            tfidf = self._tfidf_score(m.get("text","") or "", q_terms, idf) if q_terms else 0.0
-            pin_boost = 0.0
-            for r in self.dsl.pin_rules:
-                if match_mem(m, r["kind"], r["key"]):
-                    pin_boost = max(pin_boost, r["prio"])
-            score = base * (1.0 + pin_boost) + tfidf
-            why = {
-                "base_weight": round(base,4),
-                "tfidf": round(tfidf,4),
-                "pin_boost": round(pin_boost,4),
-                "final": round(score,4)
-            }
-            results.append((score, m, why))
-        results.sort(key=lambda x: x[0], reverse=True)
+        n = len(self.memories)
+        tfidf_all = self._tfidf_scores(q_terms, mask) if q_terms else [0.0] * n
+        pin_boosts = [0.0] * n
+        for r in self.dsl.pin_rules:
+            for i in self._matching(r["kind"], rule_key(r)):
+                pin_boosts[i] = max(pin_boosts[i], r["prio"])
+        # score components as parallel columns over all memories; rows outside mask are never selected
+        bases = [float(m.get("weight",1.0)) * float(max(0.0, m.get("trust",1.0))) if vis else 0.0
+                 for m, vis in zip(self.memories, mask)]
+        scores = [b * (1.0 + p) + f for b, p, f in zip(bases, pin_boosts, tfidf_all)]
+        rows = [i for i in range(n) if mask[i]]
+        if 0 <= topk < len(rows):
+            # nlargest == stable sort(reverse=True)[:topk]; ties keep memory order
+            top = heapq.nlargest(topk, rows, key=scores.__getitem__)
+        else:
+            top = sorted(rows, key=scores.__getitem__, reverse=True)[:topk]
         out = []
-        for score, m, why in results[:topk]:
+        for i in top:
+            # the score breakdown is only assembled for the memories actually returned
+            m, score = self.memories[i], scores[i]
             out.append({
                 "id": m.get("id"),
                 "topic": m.get("topic"),
@@ -301,7 +374,12 @@ class Engine:
                 "timestamp": m.get("timestamp"),
                 "text": m.get("text"),
                 "score": round(score,4),
-                "why": why
+                "why": {
+                    "base_weight": round(bases[i],4),
+                    "tfidf": round(tfidf_all[i],4),
+                    "pin_boost": round(pin_boosts[i],4),
+                    "final": round(score,4)
+                }
             })
         return out
 
@@ -315,10 +393,10 @@ def load_json(path, default):
         return default
 
 def write_csv(path, rows, header):
-    with open(path,"w",encoding="utf-8",newline="") as f:
+    with open(path,"w",encoding="utf-8",newline="",buffering=1<<20) as f:
         w = csv.writer(f)
         w.writerow(header)
-        for r in rows: w.writerow(r)
+        w.writerows(rows)
 
 def main():
     ap = argparse.ArgumentParser()
@@ -355,10 +433,9 @@ def main():
 
     if args.cmd == "run":
         # before snapshot
-        before_rows = []
-        for m in eng.memories:
-            before_rows.append([m.get("id"), m.get("topic"), ";".join(m.get("tags",[]) or []), 
-                                m.get("weight"), m.get("trust"), m.get("timestamp"), short(m.get("text", ""))])
+        before_rows = [[m.get("id"), m.get("topic"), ";".join(m.get("tags",[]) or []),
+                        m.get("weight"), m.get("trust"), m.get("timestamp"), short(m.get("text", ""))]
+                       for m in eng.memories]
         write_csv(args.before, before_rows, ["id","topic","tags","weight","trust","timestamp","text"])
         # apply rules
         eng.apply_expire()
@@ -366,24 +443,21 @@ def main():
         if args.event:
             eng.apply_reinforce(args.event)
         # after snapshot
-        after_rows = []
-        for m in eng.memories:
-            after_rows.append([m.get("id"), m.get("topic"), ";".join(m.get("tags",[]) or []), 
-                               m.get("weight"), m.get("trust"), m.get("timestamp"), "shielded" if m.get("shielded") else "", short(m.get("text",""))])
+        after_rows = [[m.get("id"), m.get("topic"), ";".join(m.get("tags",[]) or []),
+                       m.get("weight"), m.get("trust"), m.get("timestamp"), "shielded" if m.get("shielded") else "", short(m.get("text",""))]
+                      for m in eng.memories]
         write_csv(args.after, after_rows, ["id","topic","tags","weight","trust","timestamp","flags","text"])
         # audit
-        audit_rows = []
-        for a in eng.audit:
-            audit_rows.append([datetime.fromtimestamp(a.get("at",time.time())).isoformat(timespec="seconds"),
-                               a.get("type"), a.get("id"), json.dumps(a.get("rule",{}), ensure_ascii=False), a.get("prev_weight",""), a.get("new_weight","")])
-        write_csv(args.audit, audit_rows, ["at","type","memory_id","rule","prev_weight","new_weight"])
+        write_csv(args.audit, eng.audit_rows(), ["at","type","memory_id","rule","prev_weight","new_weight"])
         print(f"Done. Wrote {args.before}, {args.after}, {args.audit}")
         return
 
     if args.cmd == "retrieve":
         topk = args.topk or 0
         results = eng.retrieve(args.query, topk=(topk or None))
-        print(json.dumps({"results": results}, ensure_ascii=False, indent=2))
+        # stream straight to stdout instead of building the whole document as one string
+        json.dump({"results": results}, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
         return
 
 if __name__ == "__main__":